@@ -0,0 +1,135 @@
+import argparse
+import csv
+import os
+import tempfile
+import time
+import warnings
+
+import pandas as pd
+
+import ingest
+
+#########################
+# Parse benchmark
+#
+# Times the unpinned parse the dashboards used to run (read_csv followed by
+# pd.to_datetime with format inference) against ingest.read_raw on a synthetic
+# export built by repeating the Q1 2022 rows, and checks both give the same frame.
+# Before timing it checks ingest() against the notebook's df_transformed.csv.
+
+NOTEBOOK_PATH = "df_transformed.csv"
+
+
+def make_export(path, rows):
+    # Write a raw export of `rows` rows by repeating the Q1 2022 body
+    with open(ingest.RAW_PATH) as f:
+        header = f.readline()
+        body = [line.rstrip('\n') + '\n' for line in f]
+
+    with open(path, 'w') as f:
+        f.write(header)
+        repeats, remainder = divmod(rows, len(body))
+        for _ in range(repeats):
+            f.writelines(body)
+        f.writelines(body[:remainder])
+
+
+def check_notebook_frame(quarantine_path):
+    # ingest() on the real export must match the notebook output, except for
+    # quarantined rows and turnover taken from a quarantined previous case
+    df = ingest.ingest(ingest.RAW_PATH, quarantine_path)
+    notebook = pd.read_csv(NOTEBOOK_PATH, index_col=0)
+    for col in ['date'] + ingest.DATETIME_COLUMNS:
+        notebook[col] = pd.to_datetime(notebook[col])
+    for col in ingest.DATETIME_COLUMNS:
+        notebook[f'{col}_time'] = pd.to_datetime(notebook[f'{col}_time'], format='%H:%M:%S').dt.time
+    for col in ['duration', 'turnover_time']:
+        notebook[col] = pd.to_timedelta(notebook[col])
+
+    quarantined = notebook.index.difference(df.index)
+    notebook_kept = notebook.loc[df.index]
+    pd.testing.assert_frame_equal(df.drop(columns='turnover_time'), notebook_kept.drop(columns='turnover_time'))
+
+    # The notebook takes turnover from the previous row of the raw file
+    same_suite = notebook['or_suite'].eq(notebook['or_suite'].shift()) & notebook['date'].eq(notebook['date'].shift())
+    after_quarantined = (same_suite & notebook.index.to_series().shift().isin(quarantined)).loc[df.index]
+    differs = df['turnover_time'].ne(notebook_kept['turnover_time']) & df['turnover_time'].notna()
+    differs |= df['turnover_time'].isna() != notebook_kept['turnover_time'].isna()
+    assert not (differs & ~after_quarantined).any(), df.index[differs & ~after_quarantined].tolist()
+    print(f"ingest() matches {NOTEBOOK_PATH}: {len(quarantined)} rows quarantined, "
+          f"turnover re-measured for rows {df.index[differs].tolist()}")
+
+
+def check_blank_cells(tmp, workers):
+    # A blank suite or booking must be quarantined as missing_key, with the
+    # same clean frame from a single and a parallel read
+    with open(ingest.RAW_PATH, newline='') as f:
+        rows = list(csv.reader(f))
+    header = ingest.normalize_columns(pd.DataFrame(columns=rows[0])).columns.tolist()
+    blanked = {rows[5][1]: 'or_suite', rows[9][1]: 'booked_time_min'}
+    for row in rows[1:]:
+        if row[1] in blanked:
+            row[header.index(blanked[row[1]])] = ''
+
+    path = os.path.join(tmp, "blank_cells.csv")
+    with open(path, 'w', newline='') as f:
+        csv.writer(f).writerows(rows)
+
+    single = ingest.ingest(path, os.path.join(tmp, "quarantine_1.csv"), workers=1)
+    parallel = ingest.ingest(path, os.path.join(tmp, "quarantine_n.csv"), workers=workers)
+    pd.testing.assert_frame_equal(parallel, single)
+
+    quarantine = pd.read_csv(os.path.join(tmp, "quarantine_1.csv"), dtype=str).set_index('encounter_id')
+    assert (quarantine.loc[list(blanked), 'reason'] == 'missing_key').all(), quarantine.loc[list(blanked)]
+    print("blank or_suite/booked_time_min quarantined as missing_key")
+
+
+def parse_unpinned(path):
+    # The parse st_app01.py/st_up.py used before the ingest module
+    df = ingest.normalize_columns(pd.read_csv(path))
+    with warnings.catch_warnings():
+        # pandas warns that it falls back to per-value dateutil parsing
+        warnings.simplefilter("ignore", UserWarning)
+        for col in ['date'] + ingest.DATETIME_COLUMNS:
+            df[col] = pd.to_datetime(df[col])
+    return df
+
+
+def timed(label, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32}{elapsed:8.2f} s")
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parsing of the raw OR export")
+    parser.add_argument("--rows", type=int, default=10_000_000, help="rows in the synthetic export")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes for read_raw")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        check_notebook_frame(os.path.join(tmp, "quarantine.csv"))
+        check_blank_cells(tmp, max(args.workers, 2))
+
+        path = os.path.join(tmp, "export.csv")
+        make_export(path, args.rows)
+        print(f"{args.rows:,} rows, {os.path.getsize(path) / 1024 ** 2:,.0f} MB, engine={ingest.CSV_ENGINE}")
+
+        baseline, baseline_time = timed("unpinned read_csv + to_datetime", parse_unpinned, path)
+
+        (single, single_unparsed), single_time = timed("read_raw (1 process)", ingest.read_raw, path, 1)
+        # read_raw pins nullable Int64 for the integer columns; values must match
+        pd.testing.assert_frame_equal(single, baseline, check_dtype=False)
+        del baseline
+
+        (parallel, parallel_unparsed), parallel_time = timed(f"read_raw ({args.workers} processes)", ingest.read_raw, path, args.workers)
+        pd.testing.assert_frame_equal(parallel, single)
+        pd.testing.assert_frame_equal(parallel_unparsed, single_unparsed)
+
+    print(f"speedup: {baseline_time / single_time:.1f}x single, {baseline_time / parallel_time:.1f}x parallel")
+
+
+if __name__ == "__main__":
+    main()
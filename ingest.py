@@ -0,0 +1,217 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+# pyarrow's multithreaded CSV reader is much faster when it is installed
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    CSV_ENGINE = 'c'
+
+#########################
+# Ingestion of the raw OR export
+#
+# Mirrors the notebook pipeline (dashboard.ipynb) and validates every row in the
+# same scan. Rows that break a rule are written to the quarantine file with
+# their reason codes, so the dashboards only ever see clean data.
+
+RAW_PATH = "2022_Q1_OR_Utilization.csv"
+QUARANTINE_PATH = "df_quarantine.csv"
+
+DATE_FORMAT = '%m/%d/%y'
+DATETIME_FORMAT = '%m/%d/%y %H:%M'
+DATETIME_COLUMNS = ['or_schedule', 'wheels_in', 'start_time', 'end_time', 'wheels_out']
+
+# Text columns of the export. Pinning their dtype keeps a chunk whose values
+# are all blank from being read as float or object.
+STRING_COLUMNS = ['date', 'service', 'cpt_description'] + DATETIME_COLUMNS
+
+# Whole-number columns, read as nullable Int64 so a blank cell reaches
+# validation on every engine instead of failing the read or becoming a float
+INTEGER_COLUMNS = ['index', 'encounter_id', 'or_suite', 'cpt_code', 'booked_time_min']
+
+# Columns every case needs to be placed in a suite and compared to its booking
+KEY_COLUMNS = ['encounter_id', 'or_suite', 'booked_time_min']
+
+# Raw exports at least this large are parsed in chunks by worker processes.
+# Chunks are cut at line breaks, so a quoted field holding a line break (e.g.
+# in cpt_description) can land on a cut. A cut is inside a quoted field when
+# an odd number of quote characters precede it; read_raw then falls back to a
+# single-process read.
+PARALLEL_MIN_BYTES = 64 * 1024 ** 2
+
+# Longest gap between consecutive cases in a suite that still counts as turnover
+MAX_TURNOVER = pd.Timedelta(hours=4)
+
+
+def normalize_columns(df):
+    # Lowercase column names and replace spaces and parentheses
+    df.columns = (
+        df.columns.str.lower()
+        .str.replace(' ', '_')
+        .str.replace(r'[()]', '', regex=True)
+    )
+    return df
+
+
+def parse_timestamps(raw):
+    # Parse date and timestamp columns with their pinned formats; unparseable
+    # values become NaT. Also returns the raw text of the cells that failed to
+    # parse, on the rows that have any; every other cell is NaN.
+    parsed = {'date': pd.to_datetime(raw['date'], format=DATE_FORMAT, errors='coerce')}
+    for col in DATETIME_COLUMNS:
+        parsed[col] = pd.to_datetime(raw[col], format=DATETIME_FORMAT, errors='coerce')
+    parsed = pd.DataFrame(parsed, index=raw.index)
+
+    failed = parsed.isna() & raw[parsed.columns].notna()
+    unparsed = raw[parsed.columns].where(failed)
+    return raw.assign(**parsed), unparsed[failed.any(axis=1)]
+
+
+def _read_csv(source, names, header):
+    # Read with normalized column names and the pinned text and integer dtypes
+    dtype = {col: 'str' for col in STRING_COLUMNS if col in names}
+    dtype.update({col: 'Int64' for col in INTEGER_COLUMNS if col in names})
+    return pd.read_csv(source, header=header, names=names, dtype=dtype, engine=CSV_ENGINE)
+
+
+def _parse_chunk(path, start, end, names):
+    # Worker: read one line-aligned byte range of the export and parse it
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return parse_timestamps(_read_csv(io.BytesIO(data), names, header=None))
+
+
+def _count_quotes(path, start, end):
+    # Worker: number of quote characters in one byte range of the export
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start).count(b'"')
+
+
+def _chunk_offsets(path, chunks):
+    # Split the file body into byte ranges that start and end on line breaks
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        f.readline()
+        offsets = [f.tell()]
+        for i in range(1, chunks):
+            f.seek(max(size * i // chunks, offsets[-1]))
+            f.readline()
+            offsets.append(f.tell())
+    offsets.append(size)
+    return [(start, end) for start, end in zip(offsets, offsets[1:]) if start < end]
+
+
+def read_raw(path=RAW_PATH, workers=None):
+    # Read and parse the raw export. Large files are split into chunks that are
+    # parsed in parallel; workers=1 forces a single-process parse.
+    if workers is None:
+        workers = os.cpu_count() if os.path.getsize(path) >= PARALLEL_MIN_BYTES else 1
+
+    names = normalize_columns(pd.read_csv(path, nrows=0)).columns
+    ranges = _chunk_offsets(path, workers * 4) if workers > 1 else []
+    if len(ranges) <= 1:
+        return parse_timestamps(_read_csv(path, names, header=0))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Every cut must have an even number of quote characters before it
+        quotes = pd.Series(list(pool.map(_count_quotes, [path] * len(ranges), *zip(*ranges))))
+        aligned = not (quotes.cumsum() % 2).any()
+        if aligned:
+            futures = [pool.submit(_parse_chunk, path, start, end, names) for start, end in ranges]
+            results = [future.result() for future in futures]
+
+    if not aligned:
+        return parse_timestamps(_read_csv(path, names, header=0))
+
+    # Chunks come back in file order, so a fresh index matches a single read
+    df = pd.concat([parsed for parsed, _ in results], ignore_index=True)
+    offsets = pd.Series([len(parsed) for parsed, _ in results]).cumsum().shift(fill_value=0)
+    unparsed = pd.concat([
+        failed.set_axis(failed.index + offset) for (_, failed), offset in zip(results, offsets)
+    ])
+    return df, unparsed
+
+
+def _previous_in_suite(df, values):
+    # Value on the previous row of the same suite-day; df must be suite-ordered
+    same_suite = df['or_suite'].eq(df['or_suite'].shift()) & df['date'].eq(df['date'].shift())
+    return values.shift().where(same_suite)
+
+
+def _suite_overlaps(df):
+    # Flag cases that wheel in before every earlier case in the suite-day has
+    # left. This is a single pass, so a case that is itself flagged still
+    # holds the room for the cases after it; a double-booked block is then
+    # quarantined as a whole rather than resolved case by case.
+    room_free_at = _previous_in_suite(df, df.groupby(['date', 'or_suite'])['wheels_out'].cummax())
+    return df['wheels_in'] < room_free_at
+
+
+def validate(df):
+    # Run every rule as a column check over suite-ordered rows. Returns the
+    # sorted frame with turnover_time and a reason code per bad row.
+    #
+    # Cases wheeling in at the same time are ordered by wheels_out, then
+    # encounter_id, so the case that leaves first is kept and the other one is
+    # quarantined as its overlap.
+    df = df.sort_values(['date', 'or_suite', 'wheels_in', 'wheels_out', 'encounter_id'], kind='stable')
+
+    checks = pd.DataFrame({
+        'missing_timestamp': df[['date'] + DATETIME_COLUMNS].isna().any(axis=1),
+        'missing_key': df[KEY_COLUMNS].isna().any(axis=1),
+        'wheels_out_before_in': df['wheels_out'] < df['wheels_in'],
+        'end_before_start': df['end_time'] < df['start_time'],
+    })
+    # Overlaps are only checked between cases that are otherwise valid
+    checks['suite_overlap'] = _suite_overlaps(df[~checks.any(axis=1)]).reindex(df.index, fill_value=False)
+
+    # Turnover is measured from the previous kept case. Gaps that span midnight
+    # or exceed MAX_TURNOVER are idle time, so their turnover is left empty.
+    kept = df[~checks.any(axis=1)]
+    prev_wheels_out = _previous_in_suite(kept, kept['wheels_out'])
+    turnover = kept['wheels_in'] - prev_wheels_out
+    idle = (prev_wheels_out.dt.normalize() < kept['wheels_in'].dt.normalize()) | (turnover > MAX_TURNOVER)
+    df['turnover_time'] = turnover.mask(idle)
+
+    # Join the codes of all failed rules, e.g. "end_before_start;suite_overlap"
+    failed = checks[checks.any(axis=1)]
+    reasons = failed.dot(failed.columns + ';').str.rstrip(';')
+    return df, reasons
+
+
+def add_derived_columns(df):
+    # Time-of-day, month and duration columns, as built in the notebook.
+    # Integer columns without blanks left are cast back to plain int64.
+    df = df.astype({col: 'int64' for col in INTEGER_COLUMNS if col in df and not df[col].hasnans})
+    for col in ['or_schedule', 'start_time', 'end_time', 'wheels_in', 'wheels_out']:
+        df[f'{col}_time'] = df[col].dt.time
+    df['month'] = df['date'].dt.month_name()
+    df['duration'] = df['end_time'] - df['start_time']
+    df['turnover_time'] = df.pop('turnover_time')
+    return df
+
+
+def quarantine_rows(df, reasons, unparsed):
+    # Failing rows with their reason codes; only the timestamp cells that
+    # could not be parsed keep their original export text
+    quarantine = df.loc[reasons.index].drop(columns='turnover_time')
+    quarantine = quarantine.astype({col: object for col in unparsed.columns})
+    quarantine.update(unparsed)
+    return quarantine.assign(reason=reasons)
+
+
+def ingest(path=RAW_PATH, quarantine_path=QUARANTINE_PATH, workers=None):
+    # Load, validate and transform the raw export; returns the clean frame in
+    # suite order (date, or_suite, wheels_in)
+    df, unparsed = read_raw(path, workers)
+    df, reasons = validate(df)
+
+    quarantine_rows(df, reasons, unparsed).to_csv(quarantine_path, index=False)
+
+    return add_derived_columns(df.drop(index=reasons.index))
@@ -0,0 +1,65 @@
+import pandas as pd
+
+#########################
+# Aggregate layer
+#
+# One row per (date, or_suite), built once after ingestion. The dashboard
+# filters these rows instead of the case-level frame for the start-time and
+# schedule-accuracy KPIs.
+
+# A first case wheeling in within this margin of its booked slot is on time
+ON_TIME_GRACE = pd.Timedelta(minutes=5)
+
+
+def daily_aggregates(df):
+    # One row per suite-day from built-in grouped reductions, independent of
+    # row order. The first case is the one booked earliest (idxmin of
+    # or_schedule), as in the usual first-case on-time definition.
+    in_room_min = (df['wheels_out'] - df['wheels_in']).dt.total_seconds() / 60
+
+    # Minutes past the booking; cases finishing early count as zero
+    overrun_min = (in_room_min - df['booked_time_min']).clip(lower=0)
+
+    grouped = df.assign(
+        in_room_min=in_room_min,
+        overrun_min=overrun_min,
+        overrun=overrun_min > 0,
+    ).groupby(['date', 'or_suite'], sort=False)
+
+    daily = grouped.agg(
+        month=('month', 'first'),
+        last_wheels_out=('wheels_out', 'max'),
+        case_count=('wheels_in', 'size'),
+        booked_min=('booked_time_min', 'sum'),
+        in_room_min=('in_room_min', 'sum'),
+        overrun_min=('overrun_min', 'sum'),
+        overrun_cases=('overrun', 'sum'),
+    )
+    first_case = grouped['or_schedule'].idxmin()
+    daily['first_schedule'] = df.loc[first_case, 'or_schedule'].set_axis(first_case.index)
+    daily['first_wheels_in'] = df.loc[first_case, 'wheels_in'].set_axis(first_case.index)
+    daily = daily.reset_index()
+
+    start_delay = daily['first_wheels_in'] - daily['first_schedule']
+    daily['start_delay_min'] = start_delay.clip(lower=pd.Timedelta(0)).dt.total_seconds() / 60
+    daily['on_time_start'] = start_delay <= ON_TIME_GRACE
+    return daily
+
+
+def schedule_kpis(daily):
+    # On-time rate, delay and overrun over the (already filtered) suite-days
+    if daily.empty:
+        return {
+            'on_time_rate': float('nan'),
+            'avg_start_delay_min': float('nan'),
+            'avg_overrun_min': float('nan'),
+            'overrun_rate': float('nan'),
+        }
+
+    case_count = daily['case_count'].sum()
+    return {
+        'on_time_rate': daily['on_time_start'].mean(),
+        'avg_start_delay_min': daily['start_delay_min'].mean(),
+        'avg_overrun_min': daily['overrun_min'].sum() / case_count,
+        'overrun_rate': daily['overrun_cases'].sum() / case_count,
+    }
@@ -1,8 +1,12 @@
+import os
+
 import streamlit as st
 import pandas as pd
-import numpy as np
 import plotly.express as px
 
+from ingest import RAW_PATH, QUARANTINE_PATH, ingest
+from kpis import daily_aggregates, schedule_kpis
+
 #########################
 # Page Config
 st.set_page_config(
@@ -78,46 +82,38 @@ def format_time_delta(td):
     minutes = int(total_seconds / 60)
     return f"{minutes} mins"
 
-def load_data():
-    df = pd.read_csv("df_transformed.csv")
-    
-    # Convert date columns to datetime
-    df['date'] = pd.to_datetime(df['date'])
-    date_columns = ['or_schedule', 'wheels_in', 'start_time', 'end_time', 'wheels_out']
-    
-    for col in date_columns:
-        df[col] = pd.to_datetime(df[col])
-    
-    # Handle turnover_time column 
-    if 'turnover_time' in df.columns:
-        # If turnover_time is already in the data
-        df['turnover_time'] = pd.to_timedelta(df['turnover_time'])
-    else:
-        # Calculate turnover time if it's not already there
-        df["turnover_time"] = df.groupby(["date", "or_suite"]).apply(
-            lambda group: group["wheels_in"] - group["wheels_out"].shift(1)
-        ).reset_index(level=[0, 1], drop=True)
+def render_kpi_box(label, value, color):
+    #Render a KPI box in the dashboard card style
+    kpi_box = f"""
+    <div style="background-color: #F7F7F7; border: 1px solid #DDDDDD; border-radius: 10px; padding: 10px 10px 5px 10px; margin-bottom: 0.3rem; box-shadow: 0 2px 4px rgba(0, 0, 0, 0.1); text-align: center;">
+        <div style="font-size: 0.9rem; color: #555555; margin-bottom: 0.2rem;">{label}</div>
+        <div style="font-size: 2rem; color: {color}; font-weight: 700;">{value}</div>
+    </div>
+    """
+    st.markdown(kpi_box, unsafe_allow_html=True)
+
+@st.cache_data
+def load_data(raw_mtime):
+    # Ingest, validate and aggregate once per version of the raw export;
+    # raw_mtime only keys the cache, so a new export is picked up on the next
+    # rerun. Rows failing validation are written to the quarantine file here.
+    df = ingest(RAW_PATH, QUARANTINE_PATH)
     
     # Add week information for trending
     df['week'] = df['date'].dt.isocalendar().week
     df['week_label'] = df['date'].dt.strftime('Week %U\n%b %d')
     
-    return df
-
-def calculate_duration_minutes(row):
-    #Calculate procedure duration in minutes
-    if pd.isna(row['duration']):
-        return np.nan
+    # Calculate duration in minutes
+    df['duration_minutes'] = df['duration'].dt.total_seconds() / 60
+    
+    # Suite-day aggregates for the start-time and schedule-accuracy KPIs
+    daily = daily_aggregates(df)
     
-    duration = pd.to_timedelta(row['duration'])
-    return duration.total_seconds() / 60
+    return df, daily
 
 #########################
 # Load Data
-df = load_data()
-
-# Calculate duration in minutes
-df['duration_minutes'] = df.apply(calculate_duration_minutes, axis=1)
+df, daily = load_data(os.path.getmtime(RAW_PATH))
 
 #########################
 # Sidebar Filters
@@ -135,11 +131,14 @@ with st.sidebar:
     # Apply filters
     if selected_month != "ALL":
         filtered_df = df[df.month == selected_month]
+        filtered_daily = daily[daily.month == selected_month]
     else:
         filtered_df = df.copy()
+        filtered_daily = daily
         
     if selected_or_suite != "ALL":
         filtered_df = filtered_df[filtered_df.or_suite == int(selected_or_suite)]
+        filtered_daily = filtered_daily[filtered_daily.or_suite == int(selected_or_suite)]
     
     service_filtered_df = filtered_df.copy()
     
@@ -191,13 +190,7 @@ with col1:
         else:
             kpi_color = "#2ECC40"  # Green for under 30 minutes
     
-    kpi_box = f"""
-    <div style="background-color: #F7F7F7; border: 1px solid #DDDDDD; border-radius: 10px; padding: 10px 10px 5px 10px; margin-bottom: 0.3rem; box-shadow: 0 2px 4px rgba(0, 0, 0, 0.1); text-align: center;">
-        <div style="font-size: 0.9rem; color: #555555; margin-bottom: 0.2rem;">Average Turnover Time</div>
-        <div style="font-size: 2rem; color: {kpi_color}; font-weight: 700;">{avg_turnover_mins}</div>
-    </div>
-    """
-    st.markdown(kpi_box, unsafe_allow_html=True)
+    render_kpi_box("Average Turnover Time", avg_turnover_mins, kpi_color)
 
 
 # KPI 2: Average Case Duration
@@ -208,13 +201,36 @@ with col2:
     else:
         avg_duration_mins = f"{int(avg_duration)} mins"
     
-    kpi_box = f"""
-    <div style="background-color: #F7F7F7; border: 1px solid #DDDDDD; border-radius: 10px; padding: 10px 10px 5px 10px; margin-bottom: 0.3rem; box-shadow: 0 2px 4px rgba(0, 0, 0, 0.1); text-align: center;">
-        <div style="font-size: 0.9rem; color: #555555; margin-bottom: 0.2rem;">Average Case Duration</div>
-        <div style="font-size: 2rem; color: #0068C9; font-weight: 700;">{avg_duration_mins}</div>
-    </div>
-    """
-    st.markdown(kpi_box, unsafe_allow_html=True)
+    render_kpi_box("Average Case Duration", avg_duration_mins, "#0068C9")
+
+# KPI Metrics - Schedule Accuracy Row
+col5, col6, col7 = st.columns(3)
+schedule = schedule_kpis(filtered_daily)
+
+# KPI 3: First-Case On-Time Starts
+with col5:
+    if pd.isna(schedule['on_time_rate']):
+        render_kpi_box("First-Case On-Time Starts", "N/A", "#555555")
+    else:
+        on_time_pct = schedule['on_time_rate'] * 100
+        # Green when at least 80% of first cases start on time
+        kpi_color = "#2ECC40" if on_time_pct >= 80 else "#FF4136"
+        render_kpi_box("First-Case On-Time Starts", f"{on_time_pct:.0f}%", kpi_color)
+
+# KPI 4: Average First-Case Start Delay
+with col6:
+    if pd.isna(schedule['avg_start_delay_min']):
+        render_kpi_box("Average First-Case Start Delay", "N/A", "#555555")
+    else:
+        render_kpi_box("Average First-Case Start Delay", f"{int(schedule['avg_start_delay_min'])} mins", "#0068C9")
+
+# KPI 5: Booked vs Actual Overrun
+with col7:
+    if pd.isna(schedule['avg_overrun_min']):
+        render_kpi_box("Average Overrun vs Booked Time", "N/A", "#555555")
+    else:
+        overrun_value = f"{int(schedule['avg_overrun_min'])} mins ({schedule['overrun_rate'] * 100:.0f}% of cases)"
+        render_kpi_box("Average Overrun vs Booked Time", overrun_value, "#0068C9")
 
 # Second Row: OR Status Table and Case Volume Chart
 col3, spacer, col4 = st.columns([0.7, 0.1, 2])